@@ -4,9 +4,129 @@ import sys
 import os
 import re
 import platform
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from itertools import repeat
+
+import numpy as np
 
 from . import api_pb2
 
+# integer type of the request length accepted by the library
+REQUEST_LENGTH_TYPE = ctypes.c_int32
+# largest serialized request that can be passed to the library, in bytes
+MAX_REQUEST_LENGTH = 2 ** (8 * ctypes.sizeof(REQUEST_LENGTH_TYPE) - 1) - 1
+
+
+class ConversionCache(object):
+    """
+    A cache for accuracy and privacy usage conversions, keyed by the content of the request.
+    Conversions are pure functions of their request, so they may be reused across analyses.
+    Entries are held in memory with least-recently-used eviction, and optionally persisted to a directory,
+    to be shared across processes and sessions. The cache may be shared between threads.
+
+    To enable, assign to the conversion_cache attribute of the library wrapper:
+    `core_library.conversion_cache = ConversionCache(directory="~/.smartnoise_cache")`
+
+    :param max_size: maximum number of responses to hold in memory
+    :param directory: optional path to a directory of persisted responses. Created if it does not exist.
+    """
+    def __init__(self, max_size=1024, directory=None):
+        self.max_size = max_size
+        self.directory = directory
+        if directory is not None:
+            self.directory = os.path.expanduser(directory)
+            os.makedirs(self.directory, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(argument):
+        """
+        Compute the content address of a request.
+        The submission and argument ids of the component are ignored, because they do not affect the response.
+
+        :param argument: proto object from api.proto
+        :return: hex digest identifying the request type and content
+        """
+        normalized = type(argument)()
+        normalized.CopyFrom(argument)
+        if normalized.HasField("component"):
+            normalized.component.ClearField("submission")
+            del normalized.component.arguments.values[:]
+
+        digest = hashlib.sha256(argument.DESCRIPTOR.full_name.encode())
+        digest.update(normalized.SerializeToString(deterministic=True))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Retrieve a serialized response from memory, or from disk if persisted.
+
+        :param key: content address of the request
+        :return: the serialized response, or None if not cached
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.directory is not None:
+            try:
+                with open(os.path.join(self.directory, key), 'rb') as cache_file:
+                    value = cache_file.read()
+            except OSError:
+                pass
+            else:
+                with self._lock:
+                    self._store(key, value)
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """
+        Cache a serialized response in memory, and on disk if persisted.
+
+        :param key: content address of the request
+        :param value: the serialized response
+        """
+        with self._lock:
+            self._store(key, value)
+
+        if self.directory is not None:
+            # write to a temporary file first, so that concurrent readers never see a partial response
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+            try:
+                with os.fdopen(descriptor, 'wb') as cache_file:
+                    cache_file.write(value)
+                os.replace(temporary_path, os.path.join(self.directory, key))
+            except OSError:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+
+    def clear(self):
+        """Discard all responses held in memory. Persisted responses are retained."""
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, value):
+        # callers must hold the lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
 
 class LibraryWrapper(object):
 
@@ -27,9 +147,12 @@ class LibraryWrapper(object):
         lib_dir = os.path.join(script_dir, "lib")
         lib_smartnoise_path = os.path.join(lib_dir, f"{prefix}smartnoise_ffi{extension}")
 
+        # functions of libraries loaded via cdll release the GIL for the duration of each call,
+        # so releases from different threads run concurrently
         self.lib_smartnoise = ctypes.cdll.LoadLibrary(lib_smartnoise_path)
 
-        proto_argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int32]
+        # requests are passed as bytes objects, which ctypes hands to the library by reference
+        proto_argtypes = [ctypes.c_char_p, REQUEST_LENGTH_TYPE]
 
         class ByteBuffer(ctypes.Structure):
             _fields_ = [
@@ -71,7 +194,7 @@ class LibraryWrapper(object):
 
             self.lib_smartnoise.gaussian_mechanism.restype = ctypes.c_double
             self.lib_smartnoise.gaussian_mechanism.argtypes = [
-                ctypes.c_double, ctypes.c_double, ctypes.c_double, ctypes.c_double, ctypes.c_bool
+                ctypes.c_double, ctypes.c_double, ctypes.c_double, ctypes.c_double, ctypes.c_bool, ctypes.c_bool
             ]
 
             self.lib_smartnoise.simple_geometric_mechanism.restype = ctypes.c_int64
@@ -93,6 +216,13 @@ class LibraryWrapper(object):
         except AttributeError:
             pass
 
+        # optional ConversionCache for accuracy and privacy usage conversions
+        self.conversion_cache = None
+
+    def __reduce__(self):
+        # the library handle is specific to a process, so unpickling attaches to the library of the receiving process
+        return _get_core_library, ()
+
     def validate_analysis(self, analysis, release):
         """
         FFI Helper. Check if an analysis is differentially private, given a set of released values.
@@ -151,7 +281,8 @@ class LibraryWrapper(object):
         :param public_arguments: Public inputs to the component (like lower/upper for snapping)
         :return: A privacy usage response
         """
-        return _communicate(
+        return _communicate_cached(
+            cache=self.conversion_cache,
             argument=api_pb2.RequestAccuracyToPrivacyUsage(
                 privacy_definition=privacy_definition,
                 component=component,
@@ -174,7 +305,8 @@ class LibraryWrapper(object):
         :param alpha: Used to set the confidence level for the accuracy
         :return: Accuracy estimates
         """
-        return _communicate(
+        return _communicate_cached(
+            cache=self.conversion_cache,
             argument=api_pb2.RequestPrivacyUsageToAccuracy(
                 privacy_definition=privacy_definition,
                 component=component,
@@ -327,6 +459,132 @@ class LibraryWrapper(object):
                 ctypes.c_double(binding_probability),
                 ctypes.c_bool(enforce_constant_time))
 
+    def laplace_mechanism_array(self, value, epsilon, sensitivity, enforce_constant_time):
+        """
+        Direct api to apply the laplace mechanism to every element of an array.
+
+        :param value: float array to privatize
+        :param epsilon: float privacy parameter, either a scalar or one per element
+        :param sensitivity: float L1 sensitivity, either a scalar or one per element
+        :param enforce_constant_time: ensure all calls take the same elapsed time
+        :return: privatized float array, with the broadcast shape of the arguments
+        """
+        return _map_mechanism(
+            self.lib_smartnoise.laplace_mechanism, np.float64,
+            [(value, np.float64), (epsilon, np.float64), (sensitivity, np.float64)],
+            [enforce_constant_time])
+
+    def gaussian_mechanism_array(self, value, epsilon, delta, sensitivity, enforce_constant_time):
+        """
+        Direct api to apply the gaussian mechanism to every element of an array.
+
+        :param value: float array to privatize
+        :param epsilon: float privacy parameter, either a scalar or one per element
+        :param delta: float privacy parameter, either a scalar or one per element
+        :param sensitivity: float L2 sensitivity, either a scalar or one per element
+        :param enforce_constant_time: ensure all calls take the same elapsed time
+        :return: privatized float array, with the broadcast shape of the arguments
+        """
+        return _map_mechanism(
+            self.lib_smartnoise.gaussian_mechanism, np.float64,
+            [(value, np.float64), (epsilon, np.float64), (delta, np.float64), (sensitivity, np.float64)],
+            [False, enforce_constant_time])
+
+    def analytic_gaussian_mechanism_array(self, value, epsilon, delta, sensitivity, enforce_constant_time):
+        """
+        Direct api to apply the analytic gaussian mechanism to every element of an array.
+
+        :param value: float array to privatize
+        :param epsilon: float privacy parameter, either a scalar or one per element
+        :param delta: float privacy parameter, either a scalar or one per element
+        :param sensitivity: float L2 sensitivity, either a scalar or one per element
+        :param enforce_constant_time: ensure all calls take the same elapsed time
+        :return: privatized float array, with the broadcast shape of the arguments
+        """
+        return _map_mechanism(
+            self.lib_smartnoise.gaussian_mechanism, np.float64,
+            [(value, np.float64), (epsilon, np.float64), (delta, np.float64), (sensitivity, np.float64)],
+            [True, enforce_constant_time])
+
+    def simple_geometric_mechanism_array(self, value, epsilon, sensitivity, min, max, enforce_constant_time):
+        """
+        Direct api to apply the simple geometric mechanism to every element of an array.
+
+        :param value: integer array to privatize
+        :param epsilon: float privacy parameter, either a scalar or one per element
+        :param sensitivity: float L1 sensitivity, either a scalar or one per element
+        :param min: lower bound on the statistic, either a scalar or one per element
+        :param max: upper bound on the statistic, either a scalar or one per element
+        :param enforce_constant_time: ensure all calls take the same elapsed time
+        :return: privatized integer array, with the broadcast shape of the arguments
+        """
+        return _map_mechanism(
+            self.lib_smartnoise.simple_geometric_mechanism, np.int64,
+            [(value, np.int64), (epsilon, np.float64), (sensitivity, np.float64), (min, np.int64), (max, np.int64)],
+            [enforce_constant_time])
+
+    def snapping_mechanism_array(self, value, epsilon, sensitivity, min, max, enforce_constant_time,
+                                 binding_probability=None):
+        """
+        Direct api to apply the snapping mechanism to every element of an array.
+
+        :param value: float array to privatize
+        :param epsilon: float privacy parameter, either a scalar or one per element
+        :param sensitivity: float L1 sensitivity, either a scalar or one per element
+        :param min: lower bound on the statistic, either a scalar or one per element
+        :param max: upper bound on the statistic, either a scalar or one per element
+        :param enforce_constant_time: ensure all calls take the same elapsed time
+        :param binding_probability: optional float to scale clamping bounds based on the probability of the clamp binding
+        :return: privatized float array, with the broadcast shape of the arguments
+        """
+        arguments = [(value, np.float64), (epsilon, np.float64), (sensitivity, np.float64),
+                     (min, np.float64), (max, np.float64)]
+
+        if binding_probability is None:
+            return _map_mechanism(
+                self.lib_smartnoise.snapping_mechanism, np.float64,
+                arguments, [enforce_constant_time])
+        else:
+            return _map_mechanism(
+                self.lib_smartnoise.snapping_mechanism_binding, np.float64,
+                arguments + [(binding_probability, np.float64)], [enforce_constant_time])
+
+
+def _get_core_library():
+    """retrieve the library wrapper shared by the current process"""
+    from .base import core_library
+    return core_library
+
+
+def _map_mechanism(function, dtype, arguments, flags):
+    """
+    Apply a scalar mechanism from the direct api elementwise over broadcasted array arguments.
+
+    Arguments are converted to native python scalars in bulk, and passed straight through the argtypes
+    declared on the function, so no ctypes objects are constructed per element.
+
+    :param function: mechanism function from lib_smartnoise
+    :param dtype: numpy dtype of the privatized output
+    :param arguments: list of (array-like, numpy dtype) pairs, broadcast against each other. Arguments with an integer dtype must contain integers
+    :param flags: trailing scalar arguments shared by every call, like enforce_constant_time
+    :return: privatized array, with the broadcast shape of the arguments
+    """
+    arrays = []
+    for argument, kind in arguments:
+        array = np.asarray(argument)
+        # integer arguments are rejected rather than truncated, as with the scalar api
+        if np.issubdtype(kind, np.integer) and array.dtype.kind not in "biu":
+            raise TypeError(f"expected integer values, but got an array of {array.dtype}")
+        arrays.append(array.astype(kind, copy=False))
+    arrays = np.broadcast_arrays(*arrays)
+    shape = arrays[0].shape
+
+    columns = [array.ravel().tolist() for array in arrays]
+    columns.extend(repeat(flag) for flag in flags)
+
+    size = int(np.prod(shape, dtype=np.int64))
+    return np.fromiter(map(function, *columns), dtype=dtype, count=size).reshape(shape)
+
 
 def _communicate(function, destroy, argument, response_type):
     """
@@ -340,15 +598,24 @@ def _communicate(function, destroy, argument, response_type):
     """
     serialized_argument = argument.SerializeToString()
 
-    bytes_array = bytearray(serialized_argument)
-    buffer = (ctypes.c_ubyte * len(serialized_argument)).from_buffer(bytes_array)
-
-    byte_buffer = function(buffer, len(serialized_argument))
-    serialized_response = ctypes.string_at(byte_buffer.data, byte_buffer.len)
+    # ctypes silently truncates oversized integers, so fail loudly instead of passing a corrupt length
+    if len(serialized_argument) > MAX_REQUEST_LENGTH:
+        message = f"the serialized {argument.DESCRIPTOR.name} is {len(serialized_argument)} bytes, " \
+                  f"but the library accepts at most {MAX_REQUEST_LENGTH} bytes."
+        if isinstance(argument, api_pb2.RequestRelease):
+            message += " Consider releasing in smaller batches with Analysis.release(chunk_size=...)."
+        # every request carries the literal values it depends on, and these cannot be split
+        message += " Large literal datasets should be loaded from a path instead of passed by value."
+        raise ValueError(message)
 
-    response = response_type.FromString(serialized_response)
+    # the library only reads from the request, so the serialized bytes are shared without a copy
+    byte_buffer = function(serialized_argument, len(serialized_argument))
 
-    destroy(byte_buffer)
+    # parse directly out of the library-owned memory before it is released
+    try:
+        response = response_type.FromString(_view_byte_buffer(byte_buffer))
+    finally:
+        destroy(byte_buffer)
 
     # Errors from here are propagated up from either the rust validator or runtime
     if response.HasField("error"):
@@ -359,6 +626,48 @@ def _communicate(function, destroy, argument, response_type):
     return response.data
 
 
+def _communicate_cached(cache, function, destroy, argument, response_type):
+    """
+    Call the function with the proto argument, over ffi, unless the response to an identical request is cached.
+    Only successful responses are cached.
+
+    :param cache: ConversionCache, or None to always call the function
+    :param function: function from lib_*
+    :param destroy: function to destroy the bytebuffer returned from the function
+    :param argument: proto object from api.proto
+    :param response_type: proto object from api.proto
+    :return: the .data field of the protobuf response
+    """
+    if cache is None:
+        return _communicate(function=function, destroy=destroy, argument=argument, response_type=response_type)
+
+    data_type = type(response_type().data)
+
+    key = cache.get_key(argument)
+    cached = cache.get(key)
+    if cached is not None:
+        return data_type.FromString(cached)
+
+    data = _communicate(function=function, destroy=destroy, argument=argument, response_type=response_type)
+    cache.set(key, data.SerializeToString())
+    return data
+
+
+def _view_byte_buffer(byte_buffer):
+    """
+    Construct a zero-copy view over the memory of a ByteBuffer returned from the library.
+    The view is only valid until the ByteBuffer is destroyed.
+
+    :param byte_buffer: ByteBuffer structure returned from an ffi function
+    :return: a memoryview of unsigned bytes
+    """
+    if not byte_buffer.len:
+        return memoryview(b'')
+
+    address = ctypes.cast(byte_buffer.data, ctypes.c_void_p).value
+    return memoryview((ctypes.c_ubyte * byte_buffer.len).from_address(address)).cast('B')
+
+
 def format_error(error):
     library_traceback = error.message
 
@@ -1,12 +1,14 @@
 import json
+import struct
+import threading
 import warnings
 
-from .api import LibraryWrapper, format_error
+from .api import LibraryWrapper, ConversionCache, format_error
 from .value import *
 
 import typing
 
-from opendp.smartnoise.core import api_pb2, value_pb2, base_pb2
+from opendp.smartnoise.core import api_pb2, value_pb2, base_pb2, components_pb2
 
 core_library = LibraryWrapper()
 
@@ -14,6 +16,32 @@ core_library = LibraryWrapper()
 ALL_CONSTRAINTS = ["n", "rows", "columns", "lower", "upper", "categories"]
 
 
+def _copy_lists(value):
+    if issubclass(type(value), list):
+        return [_copy_lists(v) for v in value]
+    return value
+
+
+def _copy_release_node(release_node):
+    """
+    Copy a release node out of a release.
+    Submessages may keep the entire parent message alive, so cached release nodes are copied rather than referenced.
+    """
+    copied = base_pb2.ReleaseNode()
+    copied.CopyFrom(release_node)
+    return copied
+
+
+def _with_privacy_usage(serialized_component, privacy_usage):
+    """copy a serialized component, substituting a different privacy usage"""
+    substituted = components_pb2.Component()
+    substituted.CopyFrom(serialized_component)
+    variant = getattr(substituted, substituted.WhichOneof("variant"))
+    del variant.privacy_usage[:]
+    variant.privacy_usage.extend(serialize_privacy_usage(privacy_usage))
+    return substituted
+
+
 class Dataset(object):
     """
     Datasets represent a single tabular resource. Datasets are assumed to be private, and may be loaded from csv files or as literal arrays.
@@ -104,15 +132,41 @@ class Component(object):
         self.analysis = None
         self.component_id = None
 
-        global context
-        if context:
-            context.add_component(self, value=value, value_format=value_format, value_public=value_public)
+        analysis = active_analysis.get()
+        if analysis:
+            analysis.add_component(self, value=value, value_format=value_format, value_public=value_public)
         else:
             raise ValueError("all SmartNoise components must be created within the context of an analysis")
 
         if accuracy:
             privacy_usages = self.from_accuracy(accuracy['value'], accuracy['alpha'])
             options['privacy_usage'] = serialize_privacy_usage(privacy_usages)
+            self.invalidate()
+
+    @staticmethod
+    def _from_serialized(analysis, component_id, serialized):
+        """
+        Construct a component from its serialization, without adding it to the analysis.
+        Arguments and options are only parsed when first accessed.
+
+        :param analysis: the analysis the component belongs to
+        :param component_id: id of the component
+        :param serialized: Component protobuf
+        :return: Component
+        """
+        component = _SerializedComponent.__new__(_SerializedComponent)
+        component._serialized = serialized
+        component.name = component_name_map[serialized.WhichOneof("variant")]
+        component.analysis = analysis
+        component.component_id = component_id
+        component.submission_id = serialized.submission
+        return component
+
+    def __reduce__(self):
+        # components are pickled by reference into their analysis, which is pickled as a snapshot
+        if self.analysis is None:
+            return super().__reduce__()
+        return _get_component, (self.analysis, self.component_id)
 
     # pull the released values out from the analysis' release protobuf
     @property
@@ -121,10 +175,12 @@ class Component(object):
         Retrieve the released values from the analysis' release.
         If this returns None, then this node is not releasable.
 
+        If the node has not been released yet, only this node and the unreleased nodes it depends on are evaluated.
+
         :return: The value stored in the release corresponding to this node
         """
         if self.component_id not in self.analysis.release_values:
-            self.analysis.release()
+            self.analysis.release(component_ids=[self.component_id])
 
         return self.analysis.release_values.get(self.component_id, {"value": None})["value"]
 
@@ -137,77 +193,78 @@ class Component(object):
         """
         return self.analysis.release_values.get(self.component_id, {"privacy_usages": None})["privacy_usages"]
 
+    def invalidate(self):
+        """
+        Discard the cached serialization of this component.
+        This must be called after modifying the name, arguments or options of a component that is already in an analysis.
+        """
+        if self.analysis:
+            self.analysis._version += 1
+            self.analysis._stale_component_ids.add(self.component_id)
+            self.analysis._invalidate_properties([self.component_id])
+            self.analysis._invalidate_validation([self.component_id])
+
     def get_parents(self):
         """
         List all nodes that use this node as a dependency/argument.
-        :return: {[node_id]: [parent]}
+        :return: {[parent]: [argument name]}
         """
-        parents = [component for component in self.analysis.components.values
-                   if id(self) in list(id(i) for i in component.arguments.values())]
+        parents = [self.analysis.components[parent_id]
+                   for parent_id in sorted(self.analysis._parents.get(self.component_id, ()))]
 
-        return {parent: next(k for k, v in parent.arguments.items()
-                             if id(self) == id(v)) for parent in parents}
+        return {parent: next(name for name, argument in parent.arguments.items()
+                             if argument is not None and argument.component_id == self.component_id)
+                for parent in parents}
 
     def get_accuracy(self, alpha, privacy_usage=None):
         """
         Retrieve the accuracy for the values released by the component.
         The true value differs from the estimate by at most "accuracy amount" with (1 - alpha)100% confidence.
         """
-        self.analysis.update_properties(
-            component_ids=[arg.component_id for arg in self.arguments.values() if arg])
+        return self.analysis.get_accuracies([(self, alpha, privacy_usage)])[0]
 
-        if privacy_usage is None:
-            serialized_component = serialize_component(self)
-        else:
-            cache, self.options['privacy_usage'] = self.options['privacy_usage'], serialize_privacy_usage(privacy_usage)
-            serialized_component = serialize_component(self)
-            self.options['privacy_usage'] = cache
-
-        properties = {name: self.analysis.properties.get(arg.component_id) for name, arg in self.arguments.items() if arg}
-        response = core_library.privacy_usage_to_accuracy(
-            privacy_definition=serialize_privacy_definition(self.analysis),
-            component=serialized_component,
-            properties=serialize_argument_properties(properties),
-            public_arguments=serialize_indexmap_release_node({
-                name: self.analysis.release_values.get(arg.component_id) for name, arg in self.arguments.items()
-                if arg
-            }),
-            alpha=alpha)
+    def get_accuracy_grid(self, privacy_usages, alphas):
+        """
+        Retrieve the accuracy of the component for every combination of privacy usage and alpha.
+        The component and its inputs are serialized once for the whole grid.
 
-        value = [accuracy.value for accuracy in response.values]
-        if self.dimensionality is not None and self.dimensionality <= 1 and value:
-            value = value[0]
-        return value
+        :param privacy_usages: list of privacy usages, each in any form accepted by the privacy_usage argument
+        :param alphas: list of alphas
+        :return: numpy array of accuracies, of shape [len(privacy_usages), len(alphas)], with a trailing axis for columns if the component releases more than one column. If the library returns no accuracies, the trailing axis is kept, with length zero
+        """
+        serialized_component, properties, public_arguments = \
+            self.analysis._get_accuracy_inputs([self], derive_components=True)[self.component_id]
+        privacy_definition = serialize_privacy_definition(self.analysis)
+
+        grid = []
+        for privacy_usage in privacy_usages:
+            substituted = _with_privacy_usage(serialized_component, privacy_usage)
+            grid.append([
+                [accuracy.value for accuracy in core_library.privacy_usage_to_accuracy(
+                    privacy_definition=privacy_definition,
+                    component=substituted,
+                    properties=properties,
+                    public_arguments=public_arguments,
+                    alpha=alpha).values]
+                for alpha in alphas])
+
+        grid = np.array(grid, dtype=float)
+        columns = grid.shape[2] if grid.ndim == 3 else 0
+        grid = grid.reshape(len(privacy_usages), len(alphas), columns)
+
+        dimensionality = self.analysis._get_property_view(self.component_id)["dimensionality"]
+        if dimensionality is not None and dimensionality <= 1:
+            if columns:
+                grid = grid[..., 0]
+            elif not len(privacy_usages) or not len(alphas):
+                grid = grid.reshape(len(privacy_usages), len(alphas))
+        return grid
 
     def from_accuracy(self, value, alpha):
         """
         Retrieve the privacy usage necessary such that the true value differs from the estimate by at most "value amount" with (1 - alpha)100% confidence
         """
-
-        self.analysis.update_properties(
-            component_ids=[arg.component_id for arg in self.arguments.values() if arg])
-
-        if not issubclass(type(value), list):
-            value = [value]
-
-        if not issubclass(type(alpha), list):
-            alpha = [alpha]
-
-        privacy_usages = core_library.accuracy_to_privacy_usage(
-            privacy_definition=serialize_privacy_definition(self.analysis),
-            component=serialize_component(self),
-            properties=serialize_argument_properties({
-                name: self.analysis.properties.get(arg.component_id) for name, arg in self.arguments.items() if arg
-            }),
-            accuracies=base_pb2.Accuracies(values=[
-                base_pb2.Accuracy(value=value, alpha=alpha) for value, alpha in zip(value, alpha)
-            ]),
-            public_arguments=serialize_indexmap_release_node({
-                name: self.analysis.release_values.get(arg.component_id) for name, arg in self.arguments.items()
-                if arg
-            }))
-
-        return [parse_privacy_usage(usage) for usage in privacy_usages.values]
+        return self.analysis.from_accuracies([(self, value, alpha)])[0]
 
     @property
     def properties(self):
@@ -215,108 +272,66 @@ class Component(object):
         self.analysis.update_properties()
         return self.analysis.properties.get(self.component_id)
 
+    def _get_property(self, name):
+        """
+        Retrieve a parsed property of the component.
+        Properties are parsed once, and cached on the analysis until the properties of the component change.
+        """
+        self.analysis.update_properties()
+        view = self.analysis._get_property_view(self.component_id)
+
+        # lists are copied so that callers cannot modify the cache
+        return _copy_lists(view[name])
+
     @property
     def dimensionality(self):
         """view the statically derived dimensionality (number of axes)"""
-        try:
-            return self.properties.array.dimensionality.option
-        except AttributeError:
-            return None
+        return self._get_property("dimensionality")
 
     @property
     def nullity(self):
         """view the statically derived nullity property on the data"""
-        try:
-            return self.properties.array.nullity
-        except AttributeError:
-            return None
+        return self._get_property("nullity")
 
     @property
     def lower(self):
         """view the statically derived lower bound on the data"""
-        try:
-            value = parse_array1d_null(self.properties.array.continuous.minimum)
-            if self.dimensionality <= 1 and value:
-                value = value[0]
-            return value
-        except AttributeError:
-            return None
+        return self._get_property("lower")
 
     @property
     def upper(self):
         """view the statically derived upper bound on the data"""
-        self.analysis.update_properties()
-        try:
-            value = parse_array1d_null(self.properties.array.continuous.maximum)
-            if self.dimensionality <= 1 and value:
-                value = value[0]
-            return value
-        except AttributeError:
-            return None
+        return self._get_property("upper")
 
     @property
     def num_records(self):
         """view the statically derived number of records"""
-        try:
-            num_records = self.properties.array.num_records
-            return num_records.option if num_records.HasField("option") else None
-        except AttributeError:
-            return None
+        return self._get_property("num_records")
 
     @property
     def num_columns(self):
         """view the statically derived number of columns"""
-        try:
-            num_columns = self.properties.array.num_columns
-            return num_columns.option if num_columns.HasField("option") else None
-        except AttributeError:
-            return None
+        return self._get_property("num_columns")
 
     @property
     def data_type(self):
         """view the statically derived data type"""
-        try:
-            return {
-                value_pb2.DataType.BOOL: "bool",
-                value_pb2.DataType.I64: "int",
-                value_pb2.DataType.F64: "float",
-                value_pb2.DataType.STRING: "string"
-            }[self.properties.array.data_type]
-        except AttributeError:
-            return None
+        return self._get_property("data_type")
 
     @property
     def releasable(self):
         """check if the data from this component is releasable/public"""
-        try:
-            return self.properties.array.releasable
-        except AttributeError:
-            return None
+        return self._get_property("releasable")
 
     @property
     def categories(self):
         """view the statically derived category set"""
-        try:
-            categories = self.properties.array.categorical.categories.data
-            value = [parse_array1d(i) for i in categories]
-            if not value:
-                return None
-            if self.dimensionality <= 1 and value:
-                value = value[0]
-            return value
-        except AttributeError:
-            return None
+        return self._get_property("categories")
 
     @property
     def partition_keys(self):
-        try:
-            keys = self.properties.partitions.keys
-            value = [parse_index_key(i) for i in keys]
-            if not value:
-                return None
-            return value
-        except AttributeError:
-            return None
+        """view the statically derived partition keys"""
+        return self._get_property("partition_keys")
 
     def set(self, value):
         value = np.array(value)
@@ -341,6 +356,15 @@ class Component(object):
             'value': value,
             'public': self.releasable
         }
+        self.analysis._version += 1
+
+        self.analysis._invalidate_properties([self.component_id])
+        self.analysis._invalidate_validation([self.component_id])
+
+        # unreleased components that depend on this value need to be submitted again
+        self.analysis._pending_component_ids.update(
+            component_id for component_id in self.analysis._get_dependents([self.component_id])
+            if component_id not in self.analysis.release_values)
 
     def __pos__(self) -> "Component":
         return self
@@ -597,6 +621,42 @@ class Component(object):
         return arguments
 
 
+class _SerializedComponent(Component):
+    """
+    A component loaded from a snapshot.
+    Arguments and options are parsed from the serialized component when first accessed.
+    """
+
+    @property
+    def arguments(self):
+        self._parse_serialized()
+        return self._arguments
+
+    @arguments.setter
+    def arguments(self, arguments):
+        self._parse_serialized()
+        self._arguments = arguments
+
+    @property
+    def options(self):
+        self._parse_serialized()
+        return self._options
+
+    @options.setter
+    def options(self, options):
+        self._parse_serialized()
+        self._options = options
+
+    def _parse_serialized(self):
+        """parse arguments and options from the serialized component, if not already parsed"""
+        if self._serialized is None:
+            return
+
+        _, argument_ids, self._options = parse_component(self._serialized)
+        self._arguments = {key: self.analysis.components[argument_id] for key, argument_id in argument_ids.items()}
+        self._serialized = None
+
+
 class Analysis(object):
     """
     Top-level class that contains a definition of privacy and collection of statistics.
@@ -615,6 +675,15 @@ class Analysis(object):
     - `public_and_prior` will also retain private values previously included in the release
     - `all` for including all evaluations from all nodes, which is useful for system debugging
 
+    The cache_private flag keeps the private evaluations of every node in memory between submissions, without exposing them in the release.
+    Later submissions reuse these evaluations instead of re-loading and re-preprocessing the data.
+    This trades memory for speed in interactive sessions, as every private intermediate value is retained.
+
+    The deduplicate flag reuses an existing component whenever an identical component would be added,
+    such as the preprocessing chains created by repeated `data_lower`, `data_upper` and `data_rows` constraints.
+    Components that consume privacy budget and private literals are never deduplicated,
+    so the privacy usage of the analysis is unchanged.
+
     There are several arguments for enabling/disabling individual protections.
 
     - `protect_floating_point` (enabled by default):
@@ -638,6 +707,8 @@ class Analysis(object):
     :param neighboring: may be `substitute` or `add_remove`
     :param group_size: number of individuals to protect simultaneously
     :param filter_level: may be `public`, `public_and_prior` or `all`
+    :param cache_private: retain private evaluations between submissions
+    :param deduplicate: reuse an existing component when an identical component is added
     :param protect_floating_point: enable for protection against floating point attacks
     :param protect_elapsed_time: enable for protection against side-channel timing attacks
     :param protect_sensitivity: disable to pass custom sensitivities
@@ -648,6 +719,8 @@ class Analysis(object):
                  dynamic=True, eager=False,
                  neighboring='substitute', group_size=1,
                  filter_level='public',
+                 cache_private=False,
+                 deduplicate=False,
                  protect_floating_point=True,
                  protect_elapsed_time=False,
                  protect_sensitivity=True,
@@ -666,6 +739,14 @@ class Analysis(object):
         # configure to keep additional values in the release
         self.filter_level = filter_level
 
+        # if true, keep private evaluations between submissions, outside of the release
+        self.cache_private = cache_private
+        self._private_values = {}
+
+        # if true, identical components are only added to the graph once
+        self.deduplicate = deduplicate
+        self._component_keys = {}
+
         if eager:
             # when eager is set, the analysis is released every time a new node is added
             warnings.warn("eager graph execution is inefficient, and should only be enabled for debugging")
@@ -689,23 +770,44 @@ class Analysis(object):
         self.release_values = {}
         self.datasets: list = []
 
+        # the serialized analysis, updated in place, and the ids of components that need to be re-serialized
+        self._serialized_analysis = base_pb2.Analysis()
+        self._computation_graph = self._serialized_analysis.computation_graph
+        self._stale_component_ids = set()
+
+        # maps each component id to the ids of components that take it as an argument
+        self._parents: typing.Dict[int, typing.Set[int]] = {}
+
+        # ids of components that have not been submitted to the runtime
+        self._pending_component_ids = set()
+
+        # serialized release nodes, so that large values like literal datasets are only serialized once
+        self._serialized_release = {}
+
         # track node ids
         self.component_count = 0
 
-        # nested analyses
-        self._context_cache = None
+        # tokens for restoring the previously active analysis, one for each time this analysis is entered
+        self._context_tokens = []
 
-        # helper to track if properties are current
+        # properties of each component, and the ids of components whose properties are current
         self.properties = {}
-        self.properties_id = {
-            "count": self.component_count,
-            "submission_count": self.submission_count,
-            "component_ids": None
-        }
+        self._derived_component_ids = set()
+
+        # parsed views of the properties of each component
+        self._property_views = {}
 
         # stack traces for individual nodes that failed to execute
         self.warnings = []
 
+        # incremented whenever the graph or release changes, to tell when cached validator results are stale
+        self._version = 0
+        self._validator_results = {}
+
+        # ids of components that passed static validation, and the privacy definition they were validated under
+        self._validated_component_ids = set()
+        self._validated_privacy_definition = None
+
     def add_component(self, component, value=None, value_format=None, value_public=False):
         """
         Every component must be contained in an analysis.
@@ -723,6 +825,16 @@ class Analysis(object):
         component.component_id = self.component_count
         component.submission_id = self.submission_count
 
+        if self.deduplicate:
+            key = self._get_component_key(component, value, value_format, value_public)
+            if key in self._component_keys:
+                # alias the identical component that is already in the graph
+                component.component_id = self._component_keys[key]
+                component.submission_id = self.components[component.component_id].submission_id
+                return
+            if key is not None:
+                self._component_keys[key] = component.component_id
+
         if value is not None:
             # don't filter this private value from the analysis
             if value_public is False and self.filter_level == 'public':
@@ -734,45 +846,333 @@ class Analysis(object):
                 'public': value_public
             }
         self.components[self.component_count] = component
+        self._parents[self.component_count] = set()
+        for argument in component.arguments.values():
+            if argument is not None:
+                self._parents[argument.component_id].add(self.component_count)
+        self._stale_component_ids.add(self.component_count)
+        self._pending_component_ids.add(self.component_count)
         self.component_count += 1
+        self._version += 1
 
         if self.eager:
             self.release()
 
+    @staticmethod
+    def _get_component_key(component, value, value_format, value_public):
+        """
+        Construct a key that is shared by all components that would evaluate to the same result.
+
+        :return: bytes, or None if the component may not be deduplicated
+        """
+        # components that consume privacy budget must each be evaluated
+        if 'privacy_usage' in (component.options or {}):
+            return
+
+        # private data is never compared
+        if value is not None and not value_public:
+            return
+
+        serialized = serialize_component(component)
+        serialized.ClearField('submission')
+        key = serialized.SerializeToString(deterministic=True)
+
+        if value is not None:
+            key += serialize_value(value, value_format).SerializeToString(deterministic=True)
+        return key
+
     def update_properties(self, component_ids=None, suppress_warnings=False):
         """
-        If new nodes have been added or there has been a release, recompute the properties for all of the components.
-        """
-        if not (self.properties_id['count'] == self.component_count
-                and self.properties_id['submission_count'] == self.submission_count
-                and self.properties_id['component_ids'] == component_ids):
-            response = core_library.get_properties(
-                serialize_analysis(self),
-                serialize_release(self.release_values),
-                node_ids=component_ids)
-
-            self.properties = response.properties
-            if not suppress_warnings:
-                self.warnings = [format_error(warning) for warning in response.warnings]
-                if self.warnings:
-                    warnings.warn("Some nodes were not allowed to execute.")
-                    self.print_warnings()
-            self.properties_id = {
-                'count': self.component_count,
-                'submission_count': self.submission_count,
-                'component_ids': component_ids
-            }
+        Derive properties for any of the given components that are new, or have been invalidated by a change to the graph or release.
+        Properties of other components are retained.
 
-    def validate(self):
+        :param component_ids: optionally, the ids of the components that need properties. By default all components.
+        :param suppress_warnings: set to True to not print warnings about components whose properties fail to derive
+        """
+        if component_ids is None:
+            component_ids = self.components
+        stale = sorted(set(component_ids).difference(self._derived_component_ids))
+        if not stale:
+            return
+
+        # only the stale components and their unreleased dependencies are needed to derive properties
+        dependencies = self._get_dependencies(stale)
+        response = core_library.get_properties(
+            serialize_analysis(self, dependencies),
+            self._serialize_release({
+                component_id: self.release_values[component_id] for component_id in dependencies
+                if component_id in self.release_values
+            }),
+            node_ids=stale)
+
+        # components that fail to derive properties have no entry
+        for component_id in stale:
+            self.properties.pop(component_id, None)
+            self._property_views.pop(component_id, None)
+        self.properties.update(response.properties)
+        self._derived_component_ids.update(stale)
+        self._derived_component_ids.update(response.properties.keys())
+
+        if not suppress_warnings:
+            self.warnings = [format_error(warning) for warning in response.warnings]
+            if self.warnings:
+                warnings.warn("Some nodes were not allowed to execute.")
+                self.print_warnings()
+
+    def _invalidate_properties(self, component_ids):
+        """
+        Discard the properties of the given components, and all components that depend on them.
+
+        :param component_ids: ids of the components that changed
+        """
+        if not component_ids:
+            return
+
+        for component_id in self._get_dependents(component_ids).union(component_ids):
+            self._derived_component_ids.discard(component_id)
+            self.properties.pop(component_id, None)
+            self._property_views.pop(component_id, None)
+
+    def get_property_table(self, component_ids=None, suppress_warnings=False):
+        """
+        Retrieve the statically derived properties of many components at once, as columns.
+        Properties are derived in at most one call to the library, and each component's properties are parsed only once.
+
+        Integer columns use -1 where a property is unknown.
+        Columns that may contain a scalar or a list of values per component are object arrays, with None where unknown.
+
+        :param component_ids: optionally, the ids of the components to include. By default all components.
+        :param suppress_warnings: set to True to not print warnings about components whose properties fail to derive
+        :return: {[column name]: numpy array}, with one row per component, in order of component id
+        """
+        if component_ids is None:
+            component_ids = self.components
+        component_ids = sorted(component_ids)
+        self.update_properties(component_ids, suppress_warnings=suppress_warnings)
+
+        views = [self._get_property_view(component_id) for component_id in component_ids]
+
+        def column(values, dtype=object, missing=None):
+            array = np.empty(len(views), dtype=dtype)
+            # assigned elementwise, so that list-valued properties are not broadcast into the array
+            for index, value in enumerate(values):
+                array[index] = missing if value is None else _copy_lists(value)
+            return array
+
+        def property_column(name, dtype=object, missing=None):
+            return column((view[name] for view in views), dtype=dtype, missing=missing)
+
+        return {
+            "id": np.array(component_ids, dtype=np.int64),
+            "name": column(self.components[component_id].name for component_id in component_ids),
+            "derived": np.array([component_id in self.properties for component_id in component_ids], dtype=bool),
+            "dimensionality": property_column("dimensionality", dtype=np.int64, missing=-1),
+            "num_records": property_column("num_records", dtype=np.int64, missing=-1),
+            "num_columns": property_column("num_columns", dtype=np.int64, missing=-1),
+            "nullity": property_column("nullity", dtype=bool, missing=False),
+            "releasable": property_column("releasable", dtype=bool, missing=False),
+            "data_type": property_column("data_type"),
+            "lower": property_column("lower"),
+            "upper": property_column("upper"),
+            "categories": property_column("categories"),
+        }
+
+    def _get_property_view(self, component_id):
+        """
+        Retrieve the parsed properties of a component, as of the last derivation of properties.
+
+        :param component_id: id of the component
+        :return: dict of parsed properties, as returned by parse_value_properties
+        """
+        view = self._property_views.get(component_id)
+        if view is None:
+            view = self._property_views[component_id] = parse_value_properties(self.properties.get(component_id))
+        return view
+
+    def get_accuracies(self, requests):
+        """
+        Retrieve the accuracies of many components at once.
+        Properties are derived once, and the privacy definition and the inputs of each component are serialized once for the whole batch.
+
+        :param requests: list of (component, alpha) or (component, alpha, privacy_usage) tuples. If privacy_usage is omitted, the privacy usage of the component is used.
+        :return: list of accuracies, one for each request, as returned by Component.get_accuracy
+        """
+        requests = [tuple(request) + (None,) * (3 - len(request)) for request in requests]
+        inputs = self._get_accuracy_inputs({component for component, _, _ in requests}, derive_components=True)
+        privacy_definition = serialize_privacy_definition(self)
+
+        accuracies = []
+        for component, alpha, privacy_usage in requests:
+            serialized_component, properties, public_arguments = inputs[component.component_id]
+            if privacy_usage is not None:
+                serialized_component = _with_privacy_usage(serialized_component, privacy_usage)
+
+            response = core_library.privacy_usage_to_accuracy(
+                privacy_definition=privacy_definition,
+                component=serialized_component,
+                properties=properties,
+                public_arguments=public_arguments,
+                alpha=alpha)
+
+            value = [accuracy.value for accuracy in response.values]
+            dimensionality = self._get_property_view(component.component_id)["dimensionality"]
+            if dimensionality is not None and dimensionality <= 1 and value:
+                value = value[0]
+            accuracies.append(value)
+
+        return accuracies
+
+    def from_accuracies(self, requests):
+        """
+        Retrieve the privacy usages necessary to meet many accuracy targets at once.
+        Properties are derived once, and the privacy definition and the inputs of each component are serialized once for the whole batch.
+
+        :param requests: list of (component, value, alpha) tuples. value and alpha may be lists, with one entry per column.
+        :return: list of privacy usages, one for each request, as returned by Component.from_accuracy
+        """
+        inputs = self._get_accuracy_inputs({component for component, _, _ in requests})
+        privacy_definition = serialize_privacy_definition(self)
+
+        privacy_usages = []
+        for component, value, alpha in requests:
+            if not issubclass(type(value), list):
+                value = [value]
+            if not issubclass(type(alpha), list):
+                alpha = [alpha]
+
+            serialized_component, properties, public_arguments = inputs[component.component_id]
+            response = core_library.accuracy_to_privacy_usage(
+                privacy_definition=privacy_definition,
+                component=serialized_component,
+                properties=properties,
+                accuracies=base_pb2.Accuracies(values=[
+                    base_pb2.Accuracy(value=value, alpha=alpha) for value, alpha in zip(value, alpha)
+                ]),
+                public_arguments=public_arguments)
+
+            privacy_usages.append([parse_privacy_usage(usage) for usage in response.values])
+
+        return privacy_usages
+
+    def _get_accuracy_inputs(self, components, derive_components=False):
+        """
+        Serialize the inputs shared by accuracy and privacy usage conversions of the given components.
+        Properties of the arguments are derived in one pass.
+
+        :param components: the components to serialize inputs for
+        :param derive_components: set to True to also derive properties of the components themselves, like their dimensionality
+        :return: {[component_id]: (Component protobuf, ArgumentProperties protobuf, IndexmapReleaseNode protobuf)}
+        """
+        component_ids = {component.component_id for component in components} if derive_components else set()
+        for component in components:
+            component_ids.update(arg.component_id for arg in component.arguments.values() if arg)
+        self.update_properties(component_ids=component_ids)
+
+        computation_graph = self._get_computation_graph()
+        return {
+            component.component_id: (
+                computation_graph.value[component.component_id],
+                serialize_argument_properties({
+                    name: self.properties.get(arg.component_id) for name, arg in component.arguments.items() if arg
+                }),
+                serialize_indexmap_release_node({
+                    name: self.release_values.get(arg.component_id) for name, arg in component.arguments.items()
+                    if arg
+                }))
+            for component in components
+        }
+
+    def _serialize_release(self, release_values=None):
+        """
+        Serialize release values, reusing the serialization of any release node that has not been replaced.
+
+        :param release_values: {[component_id]: release node}, by default the release of the analysis
+        :return: Release protobuf
+        """
+        if release_values is None:
+            release_values = self.release_values
+        return serialize_release(release_values, cache=self._serialized_release)
+
+    def _get_computation_graph(self):
+        """
+        Retrieve the serialized computation graph.
+        Only components that were added or invalidated since the last call are serialized.
+
+        :return: ComputationGraph protobuf containing every component in the analysis
+        """
+        for component_id in self._stale_component_ids:
+            self._computation_graph.value[component_id].CopyFrom(serialize_component(self.components[component_id]))
+        self._stale_component_ids.clear()
+
+        return self._computation_graph
+
+    def _get_serialized_analysis(self):
+        """
+        Retrieve the serialized analysis.
+        The analysis protobuf is retained between calls, and only stale components and the privacy definition are updated.
+        The returned protobuf must not be modified.
+
+        :return: Analysis protobuf containing every component in the analysis
+        """
+        self._get_computation_graph()
+        self._serialized_analysis.privacy_definition.CopyFrom(serialize_privacy_definition(self))
+        return self._serialized_analysis
+
+    def validate(self, incremental=False):
         """
         Check if an analysis is differentially private, given a set of released values.
         This function is data agnostic. It calls the validator rust FFI with protobuf objects.
 
+        When incremental is set, only components that have not passed a prior incremental validation are checked,
+        along with the unreleased components they depend on.
+        Released values are immutable, so components that already passed validation do not need to be checked again.
+
+        :param incremental: set to True to only validate components added or modified since the last successful incremental validation
         :return: A success or failure response
         """
-        return core_library.validate_analysis(
+        if incremental:
+            return self._validate_incremental()
+
+        return self._get_validator_result("validate", lambda: core_library.validate_analysis(
             serialize_analysis(self),
-            serialize_release(self.release_values)).value
+            self._serialize_release()).value)
+
+    def _validate_incremental(self):
+        """
+        Validate the components that have not passed a prior incremental validation.
+
+        :return: A success or failure response
+        """
+        privacy_definition = serialize_privacy_definition(self).SerializeToString()
+        if privacy_definition != self._validated_privacy_definition:
+            self._validated_component_ids.clear()
+            self._validated_privacy_definition = privacy_definition
+
+        unvalidated = set(self.components).difference(self._validated_component_ids)
+        if not unvalidated:
+            return True
+
+        # traversal stops at released public values, which the validator treats as known inputs
+        dependencies = self._get_dependencies(unvalidated)
+        valid = core_library.validate_analysis(
+            serialize_analysis(self, dependencies),
+            self._serialize_release({
+                component_id: self.release_values[component_id] for component_id in dependencies
+                if component_id in self.release_values
+            })).value
+
+        if valid:
+            self._validated_component_ids.update(dependencies)
+        return valid
+
+    def _invalidate_validation(self, component_ids):
+        """
+        Require the given components, and all components that depend on them, to be validated again.
+
+        :param component_ids: ids of the components that changed
+        """
+        self._validated_component_ids.difference_update(self._get_dependents(component_ids))
+        self._validated_component_ids.difference_update(component_ids)
 
     @property
     def privacy_usage(self):
@@ -782,33 +1182,245 @@ class Analysis(object):
 
         :return: A privacy usage response
         """
-        return core_library.compute_privacy_usage(
+        cached = self._get_validator_result("privacy_usage", lambda: core_library.compute_privacy_usage(
             serialize_analysis(self),
-            serialize_release(self.release_values))
+            self._serialize_release()))
+
+        # copied, so that modifications do not leak into the cache
+        privacy_usage = type(cached)()
+        privacy_usage.CopyFrom(cached)
+        return privacy_usage
+
+    def _get_validator_result(self, name, compute):
+        """
+        Retrieve the result of a validator call, computing it only if the graph, release or privacy definition changed since it was last computed.
 
-    def release(self):
+        :param name: name of the validator call
+        :param compute: function that calls the validator
+        :return: the result of compute
+        """
+        key = (self._version, serialize_privacy_definition(self).SerializeToString())
+        cached = self._validator_results.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        result = compute()
+        self._validator_results[name] = (key, result)
+        return result
+
+    def release(self, component_ids=None, chunk_size=None):
         """
         Evaluate an analysis and release the differentially private results.
         This function touches private data. It calls the runtime rust FFI with protobuf objects.
 
         The response is stored internally in the analysis instance and the all further components are computed in the next batch.
+        Only components that were added since the prior submission are sent, along with the unreleased components they depend on.
+        The response is merged into the existing release.
+
+        When component_ids is set, only those components and the unreleased components they depend on are evaluated.
+        Other pending components are left for a later release.
+
+        When chunk_size is set, the unreleased components that no other unreleased component depends on
+        are submitted in batches of at most chunk_size components.
+        Each batch also carries the unreleased components and released values it depends on,
+        which bounds the size of each request for very large analyses.
+        Literal values, like a Dataset constructed with value=..., are sent in full with every batch that depends on them,
+        so chunking does not help when a single literal exceeds the request size limit. Load such data from a path instead.
+
+        :param component_ids: optionally, the ids of the components to release
+        :param chunk_size: optionally, the maximum number of unreleased sink components to submit at once
         """
         if not self.dynamic:
-            assert self.validate(), "cannot release, analysis is not valid"
+            assert self.validate(incremental=True), "cannot release, analysis is not valid"
 
-        response_proto: api_pb2.ResponseRelease.Success = core_library.compute_release(
-            serialize_analysis(self),
-            serialize_release(self.release_values),
-            self.stack_traces,
-            serialize_filter_level(self.filter_level))
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+
+        targets = self._pending_component_ids if component_ids is None else component_ids
+        unreleased = {component_id for component_id in targets if component_id not in self.release_values}
+
+        # intermediate components are evaluated in the same submission as the components that use them,
+        # so only the sinks of the unreleased components are submitted
+        sinks = sorted(component_id for component_id in unreleased
+                       if not self._parents.get(component_id, set()) & unreleased)
+        chunk_size = chunk_size or max(len(sinks), 1)
+
+        self.warnings = []
+        for offset in range(0, len(sinks), chunk_size):
+            self.warnings.extend(self._submit(sinks[offset:offset + chunk_size]))
+
+        if component_ids is None:
+            self._pending_component_ids.clear()
 
-        self.release_values = parse_release(response_proto.release)
-        self.warnings = [format_error(warning) for warning in response_proto.warnings]
         if self.warnings:
             warnings.warn("Some nodes were not allowed to execute.")
             self.print_warnings()
         self.submission_count += 1
 
+    def _submit(self, component_ids):
+        """
+        Submit components and their dependencies to the runtime, and merge the response into the release.
+
+        :param component_ids: ids of the components to release
+        :return: formatted warnings for components that failed to execute
+        """
+        release_values = self.release_values
+        filter_level = self.filter_level
+        known_values = None
+        if self.cache_private:
+            # private evaluations from prior submissions stand in for re-evaluating those nodes and their inputs
+            release_values = {**self._private_values, **self.release_values}
+            known_values = self._private_values
+            filter_level = 'all'
+
+        dependencies = self._get_dependencies(component_ids, known_values=known_values)
+        submitted = {
+            component_id: release_values[component_id] for component_id in dependencies
+            if component_id in release_values
+        }
+        analysis = serialize_analysis(self, dependencies)
+        release = self._serialize_release(submitted)
+
+        response_proto: api_pb2.ResponseRelease.Success = core_library.compute_release(
+            analysis,
+            release,
+            self.stack_traces,
+            serialize_filter_level(filter_level))
+        self._pending_component_ids.difference_update(dependencies)
+
+        # values that were submitted are returned unchanged, so only new evaluations are parsed
+        response_values = parse_release(response_proto.release, exclude=submitted)
+
+        # the runtime already serialized these release nodes
+        for component_id, release_node in response_values.items():
+            self._serialized_release[component_id] = (
+                release_node, _copy_release_node(response_proto.release.values[component_id]))
+
+        if self.cache_private:
+            response_values = self._cache_private_values(response_values)
+
+        self._merge_release(response_values)
+
+        # discard serializations of values that are no longer retained.
+        # Private cached values are only kept in parsed form, to not hold a second copy of the data
+        self._serialized_release = {
+            component_id: cached for component_id, cached in self._serialized_release.items()
+            if component_id in self.release_values
+        }
+
+        return [format_error(warning) for warning in response_proto.warnings]
+
+    def _cache_private_values(self, release_values):
+        """
+        Move private evaluations that the filter level would have omitted from the release into the private cache.
+
+        :param release_values: parsed release from the runtime, evaluated with the `all` filter level
+        :return: the release, as if it were evaluated with the filter level of the analysis
+        """
+        if self.filter_level == 'all':
+            return release_values
+
+        filtered = {}
+        for component_id, release_node in release_values.items():
+            if release_node['public'] or (
+                    self.filter_level == 'public_and_prior' and component_id in self.release_values):
+                filtered[component_id] = release_node
+            else:
+                self._private_values[component_id] = release_node
+        return filtered
+
+    def _merge_release(self, release_values):
+        """
+        Merge the release from a submission into the release of the analysis.
+        The result is consistent with the release that would have been returned from submitting the entire analysis.
+
+        :param release_values: parsed release from the runtime
+        """
+        previous = self.release_values.keys()
+        if self.filter_level == 'public':
+            self.release_values = {
+                component_id: release_node for component_id, release_node in self.release_values.items()
+                if release_node['public']
+            }
+        dropped = previous - self.release_values.keys()
+        added = release_values.keys() - previous
+        self.release_values.update(release_values)
+        self._version += 1
+
+        # properties may be inferred from released values
+        self._invalidate_properties(dropped | added)
+
+    def _merge_worker_release(self, released):
+        """
+        Merge the release of a copy of this analysis, that was released in another process.
+
+        :param released: the released copy of this analysis
+        """
+        release_values = {
+            component_id: release_node for component_id, release_node in released.release_values.items()
+            if component_id in self.components
+        }
+
+        # the copy already serialized these release nodes
+        for component_id, release_node in release_values.items():
+            self._serialized_release[component_id] = released._serialized_release[component_id]
+
+        self._merge_release(release_values)
+        self._serialized_release = {
+            component_id: cached for component_id, cached in self._serialized_release.items()
+            if component_id in self.release_values or component_id in self._private_values
+        }
+        self._pending_component_ids.intersection_update(released._pending_component_ids)
+        self.submission_count = released.submission_count
+
+    def _get_dependents(self, component_ids):
+        """
+        Collect the components that directly or indirectly take the given components as arguments.
+
+        :param component_ids: ids of the components to start from
+        :return: set of component ids, excluding the given component ids
+        """
+        dependents = set()
+        traversal = list(component_ids)
+
+        while traversal:
+            for parent_id in self._parents.get(traversal.pop(), ()):
+                if parent_id not in dependents:
+                    dependents.add(parent_id)
+                    traversal.append(parent_id)
+
+        return dependents.difference(component_ids)
+
+    def _get_dependencies(self, component_ids, known_values=None):
+        """
+        Collect the components necessary to evaluate the given components.
+        Traversal stops at components with public released values, because the released value is used in their place.
+
+        :param component_ids: ids of the components to evaluate
+        :param known_values: optionally, additional {[component_id]: release node} whose values are used in place of their arguments, like cached private values
+        :return: sorted list of component ids, including the given component ids
+        """
+        dependencies = set()
+        traversal = list(component_ids)
+
+        while traversal:
+            component_id = traversal.pop()
+            if component_id in dependencies:
+                continue
+            dependencies.add(component_id)
+
+            release_node = self.release_values.get(component_id)
+            if release_node is not None and release_node['public'] and release_node['value'] is not None:
+                continue
+            if known_values and component_id in known_values:
+                continue
+
+            traversal.extend(argument.component_id
+                             for argument in self.components[component_id].arguments.values()
+                             if argument is not None)
+
+        return sorted(dependencies)
+
     def report(self):
         """
         FFI Helper. Generate a json string with a summary/report of the Analysis and Release
@@ -816,9 +1428,45 @@ class Analysis(object):
 
         :return: parsed JSON array of summaries of releases
         """
-        return json.loads(core_library.generate_report(
+        # the report is cached as a string, so that each call returns a fresh copy
+        return json.loads(self._get_validator_result("report", lambda: core_library.generate_report(
             serialize_analysis(self),
-            serialize_release(self.release_values)))
+            self._serialize_release())))
+
+    def compile(self, placeholder):
+        """
+        Freeze the analysis into a template that can be released many times against different data.
+        The graph is serialized, and if dynamic validation is disabled, validated, only once.
+
+        :param placeholder: the Dataset (or its materialize or literal Component) that is rebound on each release
+        :return: AnalysisTemplate
+        """
+        if isinstance(placeholder, Dataset):
+            placeholder = placeholder.component
+        if placeholder.analysis is not self:
+            raise ValueError("the placeholder must be a part of this analysis")
+        if placeholder.name not in ("Materialize", "Literal"):
+            raise ValueError("the placeholder must be a dataset loaded from a path or a value")
+
+        if not self.dynamic:
+            assert self.validate(), "cannot compile, analysis is not valid"
+
+        # the template rebinds the placeholder in place, so it holds its own copy of the analysis
+        analysis = base_pb2.Analysis()
+        analysis.CopyFrom(serialize_analysis(self))
+
+        # only values supplied when building the graph are carried, not values released from the placeholder data
+        return AnalysisTemplate(
+            analysis=analysis,
+            release=self._serialize_release({
+                component_id: release_node for component_id, release_node in self.release_values.items()
+                if component_id != placeholder.component_id
+                and not any(self.components[component_id].arguments.values())
+            }),
+            placeholder_id=placeholder.component_id,
+            placeholder_name=placeholder.name,
+            stack_traces=self.stack_traces,
+            filter_level=self.filter_level)
 
     def clean(self):
         """
@@ -826,32 +1474,150 @@ class Analysis(object):
 
         This can be helpful to clear away components that fail property checks.
         """
-        parents = {}
-        for (component_id, component) in self.components.items():
-            parents.setdefault(component_id, set())
-            for argument in component.arguments.values():
-                if argument is None:
-                    continue
-                parents.setdefault(argument.component_id, set()).add(component_id)
-        traversal = [ident for ident, pars in parents.items() if not pars]
+        # derive properties for every component at once
+        self.update_properties()
 
-        while traversal:
-            component_id = traversal.pop()
-            component = self.components[component_id]
+        # arguments always have smaller ids than the components that use them,
+        # so all parents of a component are decided before the component itself
+        removed = set()
+        for component_id in reversed(list(self.components)):
+
+            # remove if properties fail to propagate to this node, and it is not used by a retained component
+            if component_id not in self.properties and self._parents[component_id] <= removed:
+                removed.add(component_id)
+
+        for component_id in sorted(removed, reverse=True):
+            self._remove_component(component_id)
+
+        self._component_keys = {
+            key: component_id for key, component_id in self._component_keys.items()
+            if component_id in self.components
+        }
+
+    def _remove_component(self, component_id):
+        """
+        Remove a component that is not used by any other component from the analysis.
+
+        :param component_id: id of the component to remove
+        """
+        component = self.components.pop(component_id)
+        self._version += 1
+
+        # remove this node from the parents of all children
+        del self._parents[component_id]
+        for argument in component.arguments.values():
+            if argument is not None:
+                self._parents[argument.component_id].discard(component_id)
+
+        # invalidate the component
+        component.analysis = None
+
+        self._computation_graph.value.pop(component_id, None)
+        self._stale_component_ids.discard(component_id)
+        self._private_values.pop(component_id, None)
+        self._serialized_release.pop(component_id, None)
+        self._pending_component_ids.discard(component_id)
+        self._derived_component_ids.discard(component_id)
+        self.properties.pop(component_id, None)
+        self._property_views.pop(component_id, None)
+        self._validated_component_ids.discard(component_id)
+
+    def __reduce__(self):
+        # pickled as a snapshot, so that the library handle and python object graph are not pickled
+        return Analysis._from_snapshot, (self._to_snapshot(),)
+
+    def save(self, path):
+        """
+        Save the analysis, including its release, to a snapshot file.
+        Private values in the release (like literal datasets) are included in the file.
+        Properties, validation results and cached private evaluations are not saved, and are recomputed as needed.
+
+        :param path: path of the file to write
+        """
+        with open(path, 'wb') as snapshot_file:
+            snapshot_file.write(self._to_snapshot())
 
-            # remove if properties fail to propagate to this node
-            if component.releasable is None:
+    @staticmethod
+    def load(path):
+        """
+        Load an analysis, including its release, from a snapshot file written by Analysis.save.
+        Each component is restored as a shell whose arguments and options are only parsed when first accessed,
+        so loading makes a single pass over the graph without rebuilding every component.
+        If deduplication is enabled, components added after loading are not deduplicated against loaded components.
 
-                # invalidate the component
-                component.analysis = None
-                del self.components[component_id]
+        :param path: path of the file to read
+        :return: Analysis
+        """
+        with open(path, 'rb') as snapshot_file:
+            return Analysis._from_snapshot(snapshot_file.read())
 
-                # remove this node from all children, and add children to traversal
-                for argument in component.arguments.values():
-                    if argument is None:
-                        continue
-                    parents[argument.component_id].remove(component_id)
-                    traversal.append(argument.component_id)
+    def _to_snapshot(self):
+        """
+        Serialize the analysis and its release into a snapshot:
+        length-prefixed sections of json settings, an Analysis protobuf and a Release protobuf.
+
+        :return: bytes
+        """
+        settings = {name: getattr(self, name) for name in SNAPSHOT_SETTINGS}
+        settings["version"] = SNAPSHOT_VERSION
+        settings["pending_component_ids"] = sorted(self._pending_component_ids)
+
+        sections = [
+            json.dumps(settings).encode(),
+            serialize_analysis(self).SerializeToString(),
+            self._serialize_release().SerializeToString()
+        ]
+        return b''.join(struct.pack(SNAPSHOT_LENGTH_FORMAT, len(section)) + section for section in sections)
+
+    @staticmethod
+    def _from_snapshot(snapshot):
+        """
+        Reconstruct an analysis from a snapshot produced by Analysis._to_snapshot.
+
+        :param snapshot: bytes
+        :return: Analysis
+        """
+        snapshot = memoryview(snapshot)
+        sections = []
+        offset = 0
+        prefix_size = struct.calcsize(SNAPSHOT_LENGTH_FORMAT)
+        for _ in range(3):
+            length, = struct.unpack_from(SNAPSHOT_LENGTH_FORMAT, snapshot, offset)
+            offset += prefix_size
+            sections.append(snapshot[offset:offset + length])
+            offset += length
+
+        settings = json.loads(bytes(sections[0]).decode())
+        if settings.pop("version", None) != SNAPSHOT_VERSION:
+            raise ValueError("unrecognized snapshot version")
+
+        analysis = Analysis(**{
+            name: settings[name] for name in [
+                "dynamic", "eager", "neighboring", "group_size", "filter_level", "cache_private", "deduplicate",
+                "protect_floating_point", "protect_elapsed_time", "protect_sensitivity", "stack_traces",
+                "strict_parameter_checks"]
+        })
+        for name in SNAPSHOT_SETTINGS:
+            setattr(analysis, name, settings[name])
+
+        # the loaded graph stands in as the cached serialization of every component
+        analysis._serialized_analysis = base_pb2.Analysis.FromString(sections[1])
+        analysis._computation_graph = analysis._serialized_analysis.computation_graph
+        for component_id, serialized in analysis._computation_graph.value.items():
+            analysis.components[component_id] = Component._from_serialized(analysis, component_id, serialized)
+            analysis._parents.setdefault(component_id, set())
+            for argument_id in serialized.arguments.values:
+                analysis._parents.setdefault(argument_id, set()).add(component_id)
+        analysis.components = dict(sorted(analysis.components.items()))
+
+        release = base_pb2.Release.FromString(sections[2])
+        analysis.release_values = parse_release(release)
+        analysis._serialized_release = {
+            component_id: (release_node, _copy_release_node(release.values[component_id]))
+            for component_id, release_node in analysis.release_values.items()
+        }
+        analysis._pending_component_ids = set(settings["pending_component_ids"])
+        return analysis
 
     def enter(self):
         """
@@ -859,9 +1625,7 @@ class Analysis(object):
         This allows building analyses outside of context managers, in a REPL environment.
         All new Components will be attributed to the entered analysis.
         """
-        global context
-        self._context = context
-        context = self
+        self._context_tokens.append(active_analysis.set(self))
 
     def __enter__(self):
         self.enter()
@@ -873,8 +1637,7 @@ class Analysis(object):
 
         Components constructed after exit() will not longer be attributed to the previously active analysis.
         """
-        global context
-        context = self._context
+        active_analysis.reset(self._context_tokens.pop())
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.exit()
@@ -883,8 +1646,7 @@ class Analysis(object):
         """
         print internal warnings about failed nodes after running the graph dynamically
         """
-        for warning in self.warnings:
-            print(warning)
+        _print_warnings(self.warnings)
 
     def _make_networkx(self):
         import networkx as nx
@@ -916,5 +1678,174 @@ class Analysis(object):
         plt.pause(.001)
 
 
-# sugary syntax for managing analysis contexts
-context = None
+class AnalysisTemplate(object):
+    """
+    A frozen analysis, constructed with Analysis.compile, that may be released against new data.
+    The serialized graph is reused on each release, so components are not constructed, serialized or validated again.
+    Only the file path or value of the placeholder dataset is replaced.
+
+    Values bound to a literal placeholder must have the same structure (data type and columns) as the placeholder,
+    because the analysis was validated against the properties of the placeholder.
+
+    :param analysis: Analysis protobuf
+    :param release: Release protobuf of values supplied when building the analysis
+    :param placeholder_id: id of the dataset component to rebind
+    :param placeholder_name: either `Materialize` or `Literal`
+    :param stack_traces: set to False to suppress potentially sensitive stack traces
+    :param filter_level: may be `public`, `public_and_prior` or `all`
+    """
+    def __init__(self, analysis, release, placeholder_id, placeholder_name, stack_traces, filter_level):
+        self.analysis = analysis
+        self.release_proto = release
+        self.placeholder_id = placeholder_id
+        self.placeholder_name = placeholder_name
+        self.stack_traces = stack_traces
+        self.filter_level = filter_level
+
+        # stack traces for individual nodes that failed to execute in the most recent release
+        self.warnings = []
+
+    def release(self, path=None, value=None, value_format=None):
+        """
+        Evaluate the template against new data and release the differentially private results.
+        This function touches private data. It calls the runtime rust FFI with protobuf objects.
+
+        :param path: path to a csv file, if the placeholder was loaded from a path
+        :param value: the new data, if the placeholder was a literal value
+        :param value_format: If ambiguous, the data format of the value (either array, indexmap or jagged)
+        :return: {[component_id]: release node}, in the same form as Analysis.release_values
+        """
+        if self.placeholder_name == "Materialize":
+            if path is None or value is not None:
+                raise ValueError("the placeholder was loaded from a path, so a path must be bound")
+            # the template owns its protobuf, so the new path is written in place
+            self.analysis.computation_graph.value[self.placeholder_id].materialize.file_path = path
+        else:
+            if value is None or path is not None:
+                raise ValueError("the placeholder was a literal value, so a value must be bound")
+            self.release_proto.values[self.placeholder_id].CopyFrom(serialize_release_node({
+                'value': value,
+                'value_format': value_format,
+                'public': False
+            }))
+
+        response_proto: api_pb2.ResponseRelease.Success = core_library.compute_release(
+            self.analysis,
+            self.release_proto,
+            self.stack_traces,
+            serialize_filter_level(self.filter_level))
+
+        self.warnings = [format_error(warning) for warning in response_proto.warnings]
+        if self.warnings:
+            warnings.warn("Some nodes were not allowed to execute.")
+            _print_warnings(self.warnings)
+
+        return parse_release(response_proto.release)
+
+
+def release_analyses(jobs, max_workers=None, mp_context=None):
+    """
+    Release many independent analyses in parallel, across a pool of processes.
+
+    Each job is either an Analysis, or a picklable callable (like a module-level function) that builds and returns an Analysis.
+    Analyses are sent to and from the workers as snapshots.
+    The release of each Analysis job is merged back into that analysis, as if it were released in this process.
+    Callable jobs are built and released entirely in a worker, and the resulting analysis is returned.
+
+    An error in one job does not affect other jobs. Errors are captured and returned alongside each job.
+
+    :param jobs: list of Analysis instances or callables that return an Analysis
+    :param max_workers: maximum number of processes. Defaults to the number of processors
+    :param mp_context: optional multiprocessing context, to configure how worker processes are started. Requires python 3.7 or later
+    :return: list of (analysis, error) pairs, one for each job. error is None if the release succeeded
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    # mp_context is not accepted by ProcessPoolExecutor on python 3.6
+    executor_options = {"max_workers": max_workers}
+    if mp_context is not None:
+        executor_options["mp_context"] = mp_context
+
+    with ProcessPoolExecutor(**executor_options) as executor:
+        futures = [executor.submit(_release_job, job) for job in jobs]
+
+        results = []
+        for job, future in zip(jobs, futures):
+            analysis = job if isinstance(job, Analysis) else None
+            try:
+                snapshot, job_warnings = future.result()
+                released = Analysis._from_snapshot(snapshot)
+                if analysis is None:
+                    analysis = released
+                else:
+                    analysis._merge_worker_release(released)
+                analysis.warnings = job_warnings
+            except Exception as error:
+                results.append((analysis, error))
+            else:
+                results.append((analysis, None))
+        return results
+
+
+def _release_job(job):
+    """release a job from release_analyses in a worker process"""
+    analysis = job if isinstance(job, Analysis) else job()
+    if not isinstance(analysis, Analysis):
+        raise ValueError(f"expected the job to build an Analysis, but got {type(analysis).__name__}")
+    analysis.release()
+    return analysis._to_snapshot(), analysis.warnings
+
+
+def _print_warnings(node_warnings):
+    """print formatted warnings about nodes that failed to execute"""
+    for warning in node_warnings:
+        print(warning)
+
+
+def _get_component(analysis, component_id):
+    """retrieve a component from an unpickled analysis"""
+    return analysis.components[component_id]
+
+
+# settings of an analysis that are stored in snapshots
+SNAPSHOT_SETTINGS = [
+    "dynamic", "eager", "neighboring", "group_size", "filter_level", "cache_private", "deduplicate",
+    "protect_floating_point", "protect_elapsed_time", "protect_sensitivity", "stack_traces",
+    "strict_parameter_checks", "protect_overflow", "protect_memory_utilization",
+    "submission_count", "component_count"
+]
+SNAPSHOT_VERSION = 1
+# each section of a snapshot is prefixed by its length, as an unsigned little-endian 64-bit integer
+SNAPSHOT_LENGTH_FORMAT = "<Q"
+
+
+# sugary syntax for managing analysis contexts.
+# Each thread and asyncio task has its own active analysis, so analyses may be built concurrently
+try:
+    from contextvars import ContextVar
+    active_analysis = ContextVar("active_analysis", default=None)
+except ImportError:
+    class _ThreadLocalVariable(object):
+        """
+        Fallback for contextvars.ContextVar on python 3.6, where each thread has its own value.
+
+        :param name: name of the variable
+        :param default: value of the variable in threads where it was never set
+        """
+        def __init__(self, name, default=None):
+            self.name = name
+            self._default = default
+            self._local = threading.local()
+
+        def get(self):
+            return getattr(self._local, "value", self._default)
+
+        def set(self, value):
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
+
+    active_analysis = _ThreadLocalVariable("active_analysis", default=None)
@@ -1,8 +1,18 @@
 import numpy as np
+from google.protobuf.internal import api_implementation
 
 from .variant_message_map import variant_message_map
 from opendp.smartnoise.core import base_pb2, components_pb2, value_pb2
 
+# bulk packed encoding only pays off when protobuf parses and serializes messages natively
+PACKED_FAST_PATH = api_implementation.Type() != "python"
+
+# number of elements to encode at once, to bound the memory used by intermediate arrays
+PACKED_BLOCK_SIZE = 2 ** 20
+
+# maps the variant of a serialized component back to the name of the component
+component_name_map = {variant: name for name, variant in variant_message_map.items()}
+
 
 def serialize_privacy_usage(usage):
     """
@@ -89,24 +99,52 @@ def serialize_component(component):
     })
 
 
-def serialize_analysis(analysis):
-    vertices = {}
-    for component_id in analysis.components:
-        vertices[component_id] = serialize_component(analysis.components[component_id])
+def serialize_analysis(analysis, component_ids=None):
+    """
+    Construct a protobuf object representing an analysis.
+    Serialized components are cached on the analysis, and only rebuilt when added or invalidated.
+
+    :param analysis: Analysis
+    :param component_ids: optionally, the ids of the components to include. By default all components.
+    :return: Analysis protobuf. When all components are included, this is the protobuf retained by the analysis, and must not be modified.
+    """
+    if component_ids is None:
+        return analysis._get_serialized_analysis()
+
+    computation_graph = analysis._get_computation_graph()
+    subgraph = base_pb2.ComputationGraph()
+    for component_id in component_ids:
+        subgraph.value[component_id].CopyFrom(computation_graph.value[component_id])
 
     return base_pb2.Analysis(
-        computation_graph=base_pb2.ComputationGraph(value=vertices),
+        computation_graph=subgraph,
         privacy_definition=serialize_privacy_definition(analysis)
     )
 
 
-def serialize_release(release_values):
-    return base_pb2.Release(
-        values={
-            component_id: serialize_release_node(release_node)
-            for component_id, release_node in release_values.items()
-            if release_node['value'] is not None
-        })
+def serialize_release(release_values, cache=None):
+    """
+    Construct a protobuf object representing a release
+
+    :param release_values: {[component_id]: release node}
+    :param cache: optional dict mapping component ids to (release node, ReleaseNode) pairs. Release nodes are only serialized if they are not the cached release node.
+    :return: Release
+    """
+    values = {}
+    for component_id, release_node in release_values.items():
+        if release_node['value'] is None:
+            continue
+
+        if cache is None:
+            values[component_id] = serialize_release_node(release_node)
+            continue
+
+        cached = cache.get(component_id)
+        if cached is None or cached[0] is not release_node:
+            cached = cache[component_id] = (release_node, serialize_release_node(release_node))
+        values[component_id] = cached[1]
+
+    return base_pb2.Release(values=values)
 
 
 def serialize_release_node(release_node):
@@ -150,11 +188,127 @@ def serialize_array1d(array):
         "string": value_pb2.Array1dStr,
     }[data_type]
 
+    if data_type == "string" or not PACKED_FAST_PATH:
+        container = container_type(data=array.tolist())
+    else:
+        # numeric data is written as a packed repeated field in bulk, without a python object per element
+        container = container_type.FromString(_encode_packed(data_type, array))
+
     return value_pb2.Array1d(**{
-        data_type: container_type(data=list(array))
+        data_type: container
     })
 
 
+def _encode_packed(data_type, array):
+    """
+    Encode a numeric array as the wire format of a message whose only field is a packed repeated field number 1.
+
+    :param data_type: one of "bool", "i64" or "f64"
+    :param array: 1-dimensional numpy array
+    :return: serialized message
+    """
+    if data_type == "f64":
+        payload = np.ascontiguousarray(array, dtype='<f8').tobytes()
+    elif data_type == "bool":
+        payload = np.ascontiguousarray(array, dtype=np.uint8).tobytes()
+    else:
+        # reject values that would wrap when cast, as assigning them to the repeated field element-wise does
+        if array.dtype == np.uint64 and len(array) and array.max() > np.iinfo(np.int64).max:
+            raise ValueError(f"Value out of range: {array.max()}")
+        values = np.ascontiguousarray(array, dtype=np.int64).view(np.uint64)
+        payload = b''.join(_encode_varints(values[offset:offset + PACKED_BLOCK_SIZE])
+                           for offset in range(0, len(values), PACKED_BLOCK_SIZE))
+
+    if not payload:
+        return b''
+    return b'\x0a' + _encode_varints(np.array([len(payload)], dtype=np.uint64)) + payload
+
+
+def _encode_varints(values):
+    """
+    Encode unsigned 64-bit integers as consecutive base-128 varints.
+
+    :param values: 1-dimensional array of type uint64
+    :return: bytes
+    """
+    # a 64-bit integer spans at most ten 7-bit groups
+    groups = np.arange(10, dtype=np.uint64)
+    septets = ((values[:, None] >> (groups * np.uint64(7))) & np.uint64(0x7F)).astype(np.uint8)
+
+    lengths = np.ones(len(values), dtype=np.int64)
+    for group in range(1, 10):
+        lengths += values >= np.uint64(1) << np.uint64(7 * group)
+
+    in_varint = np.arange(10)[None, :] < lengths[:, None]
+    continued = np.arange(10)[None, :] < (lengths - 1)[:, None]
+    septets[continued] |= 0x80
+
+    return septets[in_varint].tobytes()
+
+
+def _decode_varints(buffer, offset=0):
+    """
+    Decode consecutive base-128 varints.
+
+    :param buffer: bytes-like object
+    :param offset: position in the buffer where the varints start
+    :return: array of type uint64, or None if the buffer does not end on a complete varint
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8, offset=offset)
+    if not len(data):
+        return np.empty(0, dtype=np.uint64)
+
+    # the last byte of each varint has the high bit unset
+    ends = np.flatnonzero(data < 0x80)
+    if not len(ends) or ends[-1] != len(data) - 1:
+        return
+
+    # fast path when every varint is a single byte
+    if len(ends) == len(data):
+        return data.astype(np.uint64)
+
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    positions = np.arange(len(data)) - np.repeat(starts, lengths)
+
+    septets = (data & 0x7F).astype(np.uint64) << (positions.astype(np.uint64) * np.uint64(7))
+    return np.bitwise_or.reduceat(septets, starts)
+
+
+def _decode_packed(data_type, message):
+    """
+    Decode a message whose only field is a packed repeated field number 1 into a numpy array in bulk.
+
+    :param data_type: one of "bool", "i64" or "f64"
+    :param message: protobuf message, like Array1dF64
+    :return: 1-dimensional numpy array, or None if the field is not packed as expected
+    """
+    serialized = message.SerializeToString()
+    if not serialized:
+        return np.empty(0, dtype={"bool": np.bool_, "i64": np.int64, "f64": np.float64}[data_type])
+
+    # read the tag and the length prefix of the packed field
+    if serialized[0] != 0x0A:
+        return
+    prefix_length = next((i for i, byte in enumerate(serialized[1:11], start=1) if byte < 0x80), None)
+    if prefix_length is None:
+        return
+    header = _decode_varints(serialized[1:prefix_length + 1])
+    offset = prefix_length + 1
+    if header is None or int(header[0]) != len(serialized) - offset:
+        return
+
+    if data_type == "f64":
+        return np.frombuffer(serialized, dtype='<f8', offset=offset).astype(np.float64)
+
+    values = _decode_varints(serialized, offset)
+    if values is None:
+        return
+    if data_type == "bool":
+        return values != 0
+    return values.view(np.int64)
+
+
 def serialize_partitions(value):
     return base_pb2.Partitions(
         keys=[serialize_index_key(k) for k in value.keys()],
@@ -259,16 +413,31 @@ def parse_array1d(array):
         return list(getattr(array, data_type).data)
 
 
+def parse_array1d_numpy(array):
+    data_type = array.WhichOneof("data")
+    if not data_type:
+        return
+
+    container = getattr(array, data_type)
+    if data_type != "string" and PACKED_FAST_PATH:
+        # numeric data is read from the packed repeated field in bulk
+        parsed = _decode_packed(data_type, container)
+        if parsed is not None:
+            return parsed
+
+    return np.array(list(container.data))
+
+
 def parse_jagged(value):
     return [parse_array1d(column) for column in value.data]
 
 
 def parse_array(value):
-    data = parse_array1d(value.flattened)
-    if data:
+    data = parse_array1d_numpy(value.flattened)
+    if data is not None and len(data):
         if value.shape:
-            return np.array(data).reshape(value.shape)
-        return data[0]
+            return data.reshape(value.shape)
+        return data[0].item()
 
 
 def parse_dataframe(value):
@@ -293,7 +462,78 @@ def parse_value(value):
         return parse_jagged(value.jagged)
 
 
-def parse_release(release):
+def parse_value_properties(properties):
+    """
+    Parse the commonly inspected properties of a component out of a protobuf object in one pass
+
+    :param properties: ValueProperties protobuf message, or None if properties failed to derive
+    :return: dict of parsed properties. All values are None if properties failed to derive
+    """
+    view = dict.fromkeys([
+        "dimensionality", "nullity", "lower", "upper", "num_records", "num_columns",
+        "data_type", "releasable", "categories", "partition_keys"])
+    if properties is None:
+        return view
+
+    array = properties.array
+    dimensionality = array.dimensionality.option
+
+    def unwrap(value):
+        if dimensionality <= 1 and value:
+            return value[0]
+        return value
+
+    view["dimensionality"] = dimensionality
+    view["nullity"] = array.nullity
+    view["lower"] = unwrap(parse_array1d_null(array.continuous.minimum))
+    view["upper"] = unwrap(parse_array1d_null(array.continuous.maximum))
+    view["num_records"] = array.num_records.option if array.num_records.HasField("option") else None
+    view["num_columns"] = array.num_columns.option if array.num_columns.HasField("option") else None
+    view["data_type"] = {
+        value_pb2.DataType.BOOL: "bool",
+        value_pb2.DataType.I64: "int",
+        value_pb2.DataType.F64: "float",
+        value_pb2.DataType.STRING: "string"
+    }.get(array.data_type)
+    view["releasable"] = array.releasable
+    view["categories"] = unwrap([parse_array1d(i) for i in array.categorical.categories.data]) or None
+    view["partition_keys"] = [parse_index_key(i) for i in properties.partitions.keys] or None
+    return view
+
+
+def parse_component(component):
+    """
+    Parse the name, argument ids and options out of a serialized component.
+    Options are parsed into the form accepted by serialize_component.
+
+    :param component: Component protobuf
+    :return: (name, {[argument name]: component id}, options)
+    """
+    variant = component.WhichOneof("variant")
+    arguments = {
+        parse_index_key(key): component_id
+        for key, component_id in zip(component.arguments.keys, component.arguments.values)
+    }
+
+    options = {}
+    for field, value in getattr(component, variant).ListFields():
+        if field.message_type is not None and field.message_type.GetOptions().map_entry:
+            value = dict(value)
+        elif field.label == field.LABEL_REPEATED:
+            value = list(value)
+        options[field.name] = value
+
+    return component_name_map[variant], arguments, options
+
+
+def parse_release(release, exclude=None):
+    """
+    Construct a json object representing a release from a proto object
+
+    :param release: Release protobuf
+    :param exclude: optionally, a collection of node ids to skip parsing
+    :return: {[node_id]: release node}
+    """
 
     def parse_release_node(release_node):
         parsed = {
@@ -307,4 +547,5 @@ def parse_release(release):
 
     return {
         node_id: parse_release_node(release_node) for node_id, release_node in release.values.items()
+        if not exclude or node_id not in exclude
     }
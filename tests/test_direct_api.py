@@ -1,4 +1,6 @@
 
+import pytest
+
 from opendp.smartnoise.core import core_library
 
 
@@ -17,3 +19,20 @@ def test_simple_geometric_mechanism():
 def test_snapping_mechanism():
     print(core_library.snapping_mechanism(100., .5, 1.2, 50., 150., False))
     print(core_library.snapping_mechanism(100., .5, 1.2, 50., 150., False, 0.5))
+
+
+def test_mechanism_arrays():
+    import numpy as np
+    values = np.arange(10.)
+
+    print(core_library.laplace_mechanism_array(values, .5, 1.2, False))
+    print(core_library.gaussian_mechanism_array(values, np.full(10, .5), .0001, 1.2, False))
+    print(core_library.simple_geometric_mechanism_array(np.arange(10), .5, 1.2, 0, 20, False))
+    print(core_library.snapping_mechanism_array(values, .5, 1.2, 0., 20., False))
+
+    privatized = core_library.snapping_mechanism_array(values.reshape(2, 5), .5, 1.2, 0., 20., False, 0.5)
+    assert privatized.shape == (2, 5)
+
+    # integer mechanisms reject fractional input instead of truncating it
+    with pytest.raises(TypeError):
+        core_library.simple_geometric_mechanism_array(values + .5, .5, 1.2, 0, 20, False)